@@ -1,28 +1,219 @@
 k# ChattyAssistant.py
 import asyncio
-import json
+import aiohttp
+import orjson
 import logging
+import multiprocessing
+import os
+import random
+import re
+import signal
 import sys
+import time
+import types
 import io
 import contextlib
-from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, BinaryIO, Dict, List, Optional
 from colorama import Fore, Style, init
 
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
 from config import Config, Constants
 # Import our new refactored tool classes
 from tools import GoogleSearchTool, FileTool
+from semantic_cache import SemanticCache
 
 # Initialize colorama for cross-platform color support
 init(autoreset=True)
 
+# Interactive prompts, built once instead of on every input() call
+_PROMPT_YOU = f"\n{Fore.BLUE}You: {Style.RESET_ALL}"
+_PROMPT_EXIT = f"{Fore.YELLOW}Are you sure you want to exit? (yes/no): "
+_PROMPT_CLEAR_HISTORY = f"{Fore.YELLOW}Clear history? Cannot be undone. (yes/no): "
+_PROMPT_CHANGE_SETTINGS = f"{Fore.YELLOW}Change settings? (yes/no): "
+_PROMPT_CONVERSATION_TEMP = f"{Fore.YELLOW}New Conversation Temp: {Style.RESET_ALL}"
+_PROMPT_SEARCH_TEMP = f"{Fore.YELLOW}New Search/Code Temp: {Style.RESET_ALL}"
+
+# Chat history is stored as JSON Lines, one message per line, so new
+# messages can be appended without rewriting the whole file
+HISTORY_FILE = "chat_history.jsonl"
+# Older versions saved the whole history as a single JSON array
+LEGACY_HISTORY_FILE = "chat_history.json"
+
+# Responses to direct prompts are cached on disk and reused for prompts
+# whose embeddings are at least this similar
+SEMANTIC_CACHE_FILE = "semantic_cache.jsonl"
+SEMANTIC_CACHE_THRESHOLD = 0.95
+SEMANTIC_CACHE_SIZE = 1000
+EMBEDDING_MODEL = "nomic-embed-text"
+
+# After this many consecutive failed requests, Ollama calls fail fast
+# for CIRCUIT_BREAKER_COOLDOWN seconds instead of retrying
+CIRCUIT_BREAKER_THRESHOLD = 3
+CIRCUIT_BREAKER_COOLDOWN = 30
+
+# Maximum number of router decisions kept in the in-memory intent cache
+INTENT_CACHE_SIZE = 512
+
+# Markdown code fences around JSON and Python blocks in LLM responses
+_JSON_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+_PY_FENCE = re.compile(r"```python\s*(.*?)```", re.DOTALL)
+
+# A limited, safe set of built-ins for sandboxed code execution.
+# We include common built-ins like print, len, range, and type.
+# The mapping is read-only; each run gets its own globals dict and a
+# plain-dict copy of the builtins (CPython's import machinery requires a
+# real dict), so nothing a snippet defines or rebinds carries over.
+_SAFE_BUILTINS = types.MappingProxyType({
+    "print": print,
+    "len": len,
+    "range": range,
+    "str": str,
+    "int": int,
+    "float": float,
+    "list": list,
+    "dict": dict,
+    "tuple": tuple,
+    "set": set,
+    "type": type,
+    "zip": zip,
+    "sum": sum,
+    "min": min,
+    "max": max,
+    "abs": abs,
+    "round": round,
+})
+
+# Resource limits applied to the sandbox worker process
+SANDBOX_CPU_SECONDS = 5
+SANDBOX_MEMORY_BYTES = 512 * 1024 * 1024
+
+# Signals that mean the worker was killed for exceeding its limits:
+# SIGXCPU from RLIMIT_CPU, SIGKILL from the hard limit or the OOM killer
+_SANDBOX_LIMIT_SIGNALS = {
+    getattr(signal, name) for name in ("SIGXCPU", "SIGKILL") if hasattr(signal, name)
+}
+
+# Compiled code objects in the sandbox worker, keyed on their source, evicted LRU-first
+SANDBOX_CODE_CACHE_SIZE = 64
+_CODE_CACHE: "OrderedDict[str, types.CodeType]" = OrderedDict()
+
+def _sandbox_context() -> multiprocessing.context.BaseContext:
+    """
+    Returns the start method for the sandbox worker.
+    The worker is never forked from the multi-threaded assistant process.
+    """
+    try:
+        return multiprocessing.get_context("forkserver")
+    except ValueError:  # Not available on Windows
+        return multiprocessing.get_context("spawn")
+
+def _init_sandbox_worker() -> None:
+    """
+    Caps the memory available to the sandbox worker process.
+    RLIMIT_AS counts everything the worker has already mapped, so the
+    budget is added on top of its address space at startup.
+    """
+    if resource is None:
+        return
+    try:
+        with open("/proc/self/statm") as f:
+            baseline = int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        baseline = 0
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    soft = baseline + SANDBOX_MEMORY_BYTES
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+def _worker_exec(code_to_run: str) -> str:
+    """
+    Executes Python code in the sandbox worker process and returns its output.
+    Only a limited set of safe built-in functions are available to the code,
+    and each run may use at most SANDBOX_CPU_SECONDS of CPU time.
+    """
+    if resource is not None:
+        # RLIMIT_CPU counts the worker's total CPU time, so allow a fresh budget on top of what it has used
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = int(usage.ru_utime + usage.ru_stime) + SANDBOX_CPU_SECONDS
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+    redirected_output = io.StringIO()
+    try:
+        # Reuse the compiled code object when the same snippet is run again
+        code_obj = _CODE_CACHE.get(code_to_run)
+        if code_obj is None:
+            code_obj = compile(code_to_run, "<sandbox>", "exec")
+            _CODE_CACHE[code_to_run] = code_obj
+            if len(_CODE_CACHE) > SANDBOX_CODE_CACHE_SIZE:
+                _CODE_CACHE.popitem(last=False)
+        else:
+            _CODE_CACHE.move_to_end(code_to_run)
+        # Pass the limited environment to exec(), capturing everything it prints
+        with contextlib.redirect_stdout(redirected_output), contextlib.redirect_stderr(redirected_output):
+            exec(code_obj, {"__builtins__": dict(_SAFE_BUILTINS)}, {})
+        return redirected_output.getvalue()
+    except Exception as e:
+        # Return a clear error message without revealing internal details.
+        # Some errors, like MemoryError, carry no message, so name the type.
+        detail = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+        return f"An error occurred during code execution: {detail}"
+
 # --- Main Assistant Class ---
 class ChattyAssistant:
     """A streamlined, multi-functional conversational assistant with tool-use capabilities."""
+
+    __slots__ = (
+        "chat_history",
+        "last_generated_code",
+        "session_started",
+        "commands",
+        "tools",
+        "_http",
+        "_intent_cache",
+        "_semantic_cache",
+        "_embeddings_available",
+        "_exec_pool",
+        "_history_fp",
+        "_write_q",
+        "_writer_task",
+        "_consecutive_failures",
+        "_circuit_open_until",
+    )
+
     def __init__(self):
         self.chat_history = [{"role": "system", "content": Constants.SYSTEM_PROMPT}]
         self.last_generated_code = None
         Config.load_settings()
         self.session_started = False
+        # A single HTTP session is reused for every Ollama request so the
+        # connection pool stays warm between turns.
+        self._http: Optional[aiohttp.ClientSession] = None
+        # Circuit breaker state for Ollama requests
+        self._consecutive_failures = 0
+        self._circuit_open_until: float = 0
+        # Router decisions keyed on the stripped, case-preserved user input, evicted LRU-first
+        self._intent_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._semantic_cache = SemanticCache(SEMANTIC_CACHE_FILE, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE)
+        # Cleared after the first failed embedding request so later turns skip it
+        self._embeddings_available = True
+        # Worker process for sandboxed code, started on first use
+        self._exec_pool: Optional[ProcessPoolExecutor] = None
+        # Append handle for the history file, opened by _load_history()
+        self._history_fp: Optional[BinaryIO] = None
+        # Serialized history lines waiting to be written by _history_writer()
+        self._write_q: "asyncio.Queue[bytes]" = asyncio.Queue()
+        self._writer_task: Optional[asyncio.Task] = None
         
         # A dictionary to map user commands to methods for a cleaner handler
         self.commands = {
@@ -42,143 +233,336 @@ class ChattyAssistant:
             "file_tool": FileTool(),
         }
 
+    async def __aenter__(self) -> "ChattyAssistant":
+        await self._get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Returns the shared HTTP session, creating it on first use."""
+        if self._http is None or self._http.closed:
+            # Idle connections are kept for longer than a typical pause between
+            # turns, so the next request doesn't have to reconnect
+            self._http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=10,
+                    limit_per_host=4,
+                    keepalive_timeout=120,
+                    enable_cleanup_closed=True,
+                ),
+                headers={"Connection": "keep-alive"},
+                # Bound the wait between streamed chunks rather than the whole
+                # response, so long generations aren't cut off
+                timeout=aiohttp.ClientTimeout(total=None, sock_read=120),
+            )
+        return self._http
+
+    async def aclose(self) -> None:
+        """Closes the sandbox worker, the shared HTTP session and the history file, if they were opened."""
+        if self._exec_pool is not None:
+            self._exec_pool.shutdown(wait=False, cancel_futures=True)
+            self._exec_pool = None
+        if self._http is not None and not self._http.closed:
+            await self._http.close()
+        self._http = None
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._writer_task
+            self._writer_task = None
+        self._write_history_batch([])
+        if self._history_fp is not None:
+            self._history_fp.close()
+            self._history_fp = None
+
     async def _parse_llm_json(self, response_text: str) -> Optional[Dict[str, Any]]:
         """Parses JSON from a response, handling common markdown and nested formats."""
         try:
-            return json.loads(response_text)
-        except json.JSONDecodeError:
-            try:
-                # Attempt to extract JSON from a markdown block
-                json_str = response_text.split('```json')[1].split('```')[0].strip()
-                return json.loads(json_str)
-            except (IndexError, json.JSONDecodeError):
-                logging.error("Failed to parse JSON from LLM response.")
+            return orjson.loads(response_text)
+        except orjson.JSONDecodeError:
+            # Attempt to extract JSON from a markdown block
+            match = _JSON_FENCE.search(response_text)
+            if match:
+                try:
+                    return orjson.loads(match.group(1).strip())
+                except orjson.JSONDecodeError:
+                    pass
+            logging.error("Failed to parse JSON from LLM response.")
         return None
 
-    async def _send_to_ollama(self, prompt: str, temperature: float, format_as: str = "json") -> Optional[Dict[str, Any]]:
-        """Sends a prompt and returns a parsed JSON response with retry logic."""
+    def _get_cached_intent(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns a cached router decision for the given input, if any."""
+        response = self._intent_cache.get(key)
+        if response is not None:
+            self._intent_cache.move_to_end(key)
+        return response
+
+    def _cache_intent(self, key: str, response: Dict[str, Any]) -> None:
+        """Stores a router decision, evicting the least recently used entry when full."""
+        self._intent_cache[key] = response
+        self._intent_cache.move_to_end(key)
+        if len(self._intent_cache) > INTENT_CACHE_SIZE:
+            self._intent_cache.popitem(last=False)
+
+    async def _send_to_ollama(self, prompt: str, temperature: float, format_as: str = "json", echo: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Sends a prompt and returns a parsed JSON response with retry logic.
+        The response is streamed; with echo=True, text tokens are printed as they arrive.
+        """
         payload = {
             "model": "phi3:mini",
             "prompt": prompt,
-            "stream": False,
+            "stream": True,
             "format": format_as,
             "temperature": temperature
         }
         
+        if time.monotonic() < self._circuit_open_until:
+            logging.warning("Ollama is unreachable; skipping request until the circuit breaker resets.")
+            return None
+
         max_retries = 3
         for attempt in range(max_retries):
+            # Once tokens are on screen a retry would print the response twice
+            echoed = False
             try:
-                import aiohttp
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(Constants.OLLAMA_API_URL, json=payload) as response:
-                        response.raise_for_status()
-                        response_text = await response.text()
-                        if format_as == "json":
-                            return await self._parse_llm_json(response_text)
-                        return response_text # For text responses
+                session = await self._get_session()
+                async with session.post(
+                    Constants.OLLAMA_API_URL,
+                    data=orjson.dumps(payload),
+                    headers={"Content-Type": "application/json"},
+                ) as response:
+                    response.raise_for_status()
+                    if echo:
+                        print()
+                    tokens = []
+                    # Ollama streams one JSON object per line, each carrying a "response" fragment
+                    async for line in response.content:
+                        if not line.strip():
+                            continue
+                        try:
+                            chunk = orjson.loads(line)
+                        except orjson.JSONDecodeError:
+                            logging.warning("Skipping malformed line in Ollama response stream.")
+                            continue
+                        token = chunk.get("response", "")
+                        if token:
+                            tokens.append(token)
+                            if echo:
+                                print(Fore.CYAN + token, end="", flush=True)
+                                echoed = True
+                        if chunk.get("done"):
+                            break
+                    if echo:
+                        print(f"{Style.RESET_ALL}\n")
+                    response_text = "".join(tokens)
+                    self._consecutive_failures = 0
+                    if format_as == "json":
+                        return await self._parse_llm_json(response_text)
+                    return response_text # For text responses
             except aiohttp.ClientError as e:
                 logging.error(f"Network error: {e}. Attempt {attempt + 1} of {max_retries}.")
-                await asyncio.sleep(2 ** attempt)
+                self._consecutive_failures += 1
+                if echoed:
+                    print(f"{Style.RESET_ALL}\n{Fore.RED}The response was interrupted. Please try again.")
+                    return None
+                if self._consecutive_failures >= CIRCUIT_BREAKER_THRESHOLD:
+                    self._circuit_open_until = time.monotonic() + CIRCUIT_BREAKER_COOLDOWN
+                    break
+                if attempt + 1 < max_retries:
+                    # Jittered exponential backoff avoids retrying in lockstep
+                    await asyncio.sleep(min(2 ** attempt, 8) * (0.5 + random.random()))
             except Exception as e:
                 logging.error(f"An unexpected error occurred: {e}")
                 return None
         print(f"{Fore.RED}A network error occurred after multiple attempts. Is Ollama running?")
         return None
 
-    def _run_code(self, code_to_run: str) -> str:
+    async def _embed(self, text: str) -> Optional[List[float]]:
         """
-        Executes Python code in a secure, sandboxed environment.
-        Only a limited set of safe built-in functions are available to the code.
-        This prevents malicious code from accessing system resources.
+        Returns an embedding for the text from Ollama, or None if unavailable.
+        After the first failure, embeddings are disabled for the rest of the session.
         """
-        # Define a limited, safe environment for code execution.
-        # We include common built-ins like print, len, range, and type.
-        safe_globals = {
-            "__builtins__": {
-                "print": print,
-                "len": len,
-                "range": range,
-                "str": str,
-                "int": int,
-                "float": float,
-                "list": list,
-                "dict": dict,
-                "tuple": tuple,
-                "set": set,
-                "type": type,
-                "zip": zip,
-                "sum": sum,
-                "min": min,
-                "max": max,
-                "abs": abs,
-                "round": round,
-            }
-        }
-        safe_locals = {}
+        if not self._embeddings_available:
+            return None
+        payload = {"model": EMBEDDING_MODEL, "prompt": text}
+        url = Constants.OLLAMA_API_URL.rsplit("/", 1)[0] + "/embeddings"
+        try:
+            session = await self._get_session()
+            async with session.post(
+                url,
+                data=orjson.dumps(payload),
+                headers={"Content-Type": "application/json"},
+            ) as response:
+                response.raise_for_status()
+                return orjson.loads(await response.read()).get("embedding") or None
+        except (aiohttp.ClientError, orjson.JSONDecodeError) as e:
+            logging.warning(f"Embedding request failed: {e}. Falling back to exact-match caching.")
+            self._embeddings_available = False
+            return None
 
-        old_stdout = sys.stdout
-        old_stderr = sys.stderr
-        redirected_output = io.StringIO()
-        sys.stdout = redirected_output
-        sys.stderr = redirected_output
-        
+    async def _cached_send(self, prompt: str, temperature: float, format_as: str = "text", echo: bool = False) -> Optional[Any]:
+        """
+        Sends a prompt through the semantic cache: an exact match is tried first,
+        then the nearest cached prompt by embedding, and only then Ollama itself.
+        """
+        cached = self._semantic_cache.get_exact(prompt)
+        if cached is None:
+            embedding = await self._embed(prompt)
+            if embedding is not None:
+                cached = self._semantic_cache.get_similar(embedding)
+        if cached is not None:
+            if echo:
+                print(f"\n{Fore.CYAN}{cached}{Style.RESET_ALL}\n")
+            return cached
+
+        response = await self._send_to_ollama(prompt, temperature, format_as=format_as, echo=echo)
+        if response:
+            self._semantic_cache.add(prompt, embedding, response)
+        return response
+
+    async def _run_code(self, code_to_run: str) -> str:
+        """
+        Executes Python code in a secure, sandboxed worker process.
+        Running outside the main process keeps the event loop responsive and
+        lets the OS enforce CPU and memory limits on the code.
+        """
+        if self._exec_pool is None:
+            self._exec_pool = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=_sandbox_context(),
+                initializer=_init_sandbox_worker,
+            )
+        future = self._exec_pool.submit(_worker_exec, code_to_run)
+        # Keep handles on the workers so their exit codes can be checked if the pool breaks
+        workers = list(self._exec_pool._processes.values())
         try:
-            # Pass the limited environment to exec()
-            exec(code_to_run, safe_globals, safe_locals)
-            return redirected_output.getvalue()
-        except Exception as e:
-            # Return a clear error message without revealing internal details
-            return f"An error occurred during code execution: {e}"
-        finally:
-            sys.stdout = old_stdout
-            sys.stderr = old_stderr
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            # Start a fresh worker next time
+            self._exec_pool.shutdown(wait=False)
+            self._exec_pool = None
+            for worker in workers:
+                await asyncio.to_thread(worker.join, 1)
+                if worker.exitcode is not None and -worker.exitcode in _SANDBOX_LIMIT_SIGNALS:
+                    return "An error occurred during code execution: the code exceeded its resource limits."
+            return "An error occurred during code execution: the sandbox worker stopped unexpectedly."
     
     def _extract_code(self, text: str) -> Optional[str]:
         """Extracts a Python code block from a markdown string."""
-        try:
-            return text.split('```python')[1].split('```')[0].strip()
-        except IndexError:
-            return None
+        match = _PY_FENCE.search(text)
+        return match.group(1).strip() if match else None
     
     async def _exit(self):
         """Exits the application gracefully."""
-        confirm = (await asyncio.to_thread(input, f"{Fore.YELLOW}Are you sure you want to exit? (yes/no): ")).lower()
+        confirm = (await asyncio.to_thread(input, _PROMPT_EXIT)).lower()
         if confirm.startswith('y'):
-            self._save_history()
+            await self._save_history()
+            await self.aclose()
             print(f"{Fore.GREEN}Goodbye!")
             sys.exit(0)
     
-    def _save_history(self):
-        """Saves chat history to a JSON file."""
+    def _append_history(self, message: Dict[str, Any]) -> None:
+        """Adds a message to the chat history and queues it for the history file."""
+        self.chat_history.append(message)
+        self._write_q.put_nowait(orjson.dumps(message) + b"\n")
+
+    def _write_history_batch(self, batch: List[bytes]) -> None:
+        """Writes the given lines plus anything else queued in a single write."""
+        while not self._write_q.empty():
+            batch.append(self._write_q.get_nowait())
+        if not batch or self._history_fp is None:
+            return
+        try:
+            self._history_fp.write(b"".join(batch))
+            self._history_fp.flush()
+        except IOError as e:
+            logging.error(f"Failed to write chat history: {e}")
+
+    async def _history_writer(self) -> None:
+        """Background task that coalesces queued history lines into batched writes."""
+        while True:
+            self._write_history_batch([await self._write_q.get()])
+            await asyncio.sleep(0.1)
+
+    async def _save_history(self):
+        """Writes any queued messages and syncs the chat history file to disk."""
+        self._write_history_batch([])
+        if self._history_fp is None:
+            return
         try:
-            with open("chat_history.json", "w") as f:
-                json.dump(self.chat_history[1:], f, indent=4)
+            os.fsync(self._history_fp.fileno())
             print(f"{Fore.GREEN}Chat history saved.")
         except IOError as e:
             logging.error(f"Failed to save chat history: {e}")
     
+    def _import_legacy_history(self):
+        """Converts a chat history saved by older versions into the JSON Lines file."""
+        try:
+            with open(LEGACY_HISTORY_FILE, "rb") as f:
+                messages = orjson.loads(f.read())
+        except FileNotFoundError:
+            return
+        except (IOError, orjson.JSONDecodeError) as e:
+            logging.error(f"Failed to import {LEGACY_HISTORY_FILE}: {e}")
+            return
+        if not isinstance(messages, list):
+            logging.error(f"Failed to import {LEGACY_HISTORY_FILE}: expected a list of messages.")
+            return
+        try:
+            with open(HISTORY_FILE, "wb") as f:
+                f.write(b"".join(orjson.dumps(message) + b"\n" for message in messages))
+            print(f"{Fore.GREEN}Imported chat history from {LEGACY_HISTORY_FILE}.")
+        except IOError as e:
+            logging.error(f"Failed to import {LEGACY_HISTORY_FILE}: {e}")
+
     def _load_history(self):
-        """Loads chat history from a JSON file."""
+        """Loads chat history from a JSON Lines file and opens it for appending."""
+        if not os.path.exists(HISTORY_FILE):
+            self._import_legacy_history()
+
+        # A write cut short by a crash can leave a partial last line without a newline
+        needs_newline = False
         try:
-            with open("chat_history.json", "r") as f:
-                self.chat_history.extend(json.load(f))
+            with open(HISTORY_FILE, "rb") as f:
+                for line in f:
+                    needs_newline = not line.endswith(b"\n")
+                    if not line.strip():
+                        continue
+                    try:
+                        self.chat_history.append(orjson.loads(line))
+                    except orjson.JSONDecodeError:
+                        logging.warning("Skipping malformed line in chat history.")
             print(f"{Fore.GREEN}Chat history loaded.")
         except FileNotFoundError:
             logging.info("No history found. Starting a new session.")
-        except (IOError, json.JSONDecodeError) as e:
+        except IOError as e:
             logging.error(f"Failed to load chat history: {e}")
+
+        try:
+            self._history_fp = open(HISTORY_FILE, "ab")
+            if needs_newline:
+                # Keep new messages off the end of the partial line
+                self._history_fp.write(b"\n")
+                self._history_fp.flush()
+        except IOError as e:
+            logging.error(f"Failed to open chat history for writing: {e}")
     
     async def _clear_history(self):
-        """Clears the current chat history and deletes the file."""
-        confirm = (await asyncio.to_thread(input, f"{Fore.YELLOW}Clear history? Cannot be undone. (yes/no): ")).lower()
+        """Clears the current chat history and response cache, and truncates the history file."""
+        confirm = (await asyncio.to_thread(input, _PROMPT_CLEAR_HISTORY)).lower()
         if confirm.startswith('y'):
             self.chat_history = [self.chat_history[0]]
-            try:
-                import os
-                os.remove("chat_history.json")
-                print(f"{Fore.GREEN}Chat history cleared.")
-            except FileNotFoundError:
+            self._semantic_cache.clear()
+            self._write_history_batch([])
+            if self._history_fp is None or self._history_fp.tell() == 0:
                 print(f"{Fore.GREEN}Chat history already empty.")
+                return
+            self._history_fp.seek(0)
+            self._history_fp.truncate()
+            print(f"{Fore.GREEN}Chat history cleared.")
     
     async def _show_help(self):
         """Displays help information."""
@@ -195,7 +579,7 @@ class ChattyAssistant:
         """Executes the last generated code block."""
         if self.last_generated_code:
             print(f"\n{Fore.MAGENTA}Running code...{Style.RESET_ALL}")
-            output = await asyncio.to_thread(self._run_code, self.last_generated_code)
+            output = await self._run_code(self.last_generated_code)
             print(f"\n{Fore.MAGENTA}--- Code Output ---{Style.RESET_ALL}")
             print(output)
             print(f"{Fore.MAGENTA}-------------------{Style.RESET_ALL}\n")
@@ -224,16 +608,16 @@ class ChattyAssistant:
         print(f"Search/Code Temperature: {Config.TEMPERATURE_SEARCH}")
         print("---")
         
-        change_settings = (await asyncio.to_thread(input, f"{Fore.YELLOW}Change settings? (yes/no): ")).lower()
+        change_settings = (await asyncio.to_thread(input, _PROMPT_CHANGE_SETTINGS)).lower()
         if not change_settings.startswith('y'):
             return
     
         print("Enter new values (0.1 to 1.0).")
         try:
-            new_conv_temp = float(await asyncio.to_thread(input, f"{Fore.YELLOW}New Conversation Temp: {Style.RESET_ALL}"))
+            new_conv_temp = float(await asyncio.to_thread(input, _PROMPT_CONVERSATION_TEMP))
             if 0.1 <= new_conv_temp <= 1.0: Config.TEMPERATURE_CONVERSATION = new_conv_temp
             
-            new_search_temp = float(await asyncio.to_thread(input, f"{Fore.YELLOW}New Search/Code Temp: {Style.RESET_ALL}"))
+            new_search_temp = float(await asyncio.to_thread(input, _PROMPT_SEARCH_TEMP))
             if 0.1 <= new_search_temp <= 1.0: Config.TEMPERATURE_SEARCH = new_search_temp
             
             print(f"{Fore.GREEN}Settings updated successfully.")
@@ -244,6 +628,8 @@ class ChattyAssistant:
     async def run(self):
         """Main loop for the assistant."""
         self._load_history()
+        if self._writer_task is None:
+            self._writer_task = asyncio.create_task(self._history_writer())
         
         if not self.session_started:
             print("Hello! I'm your conversational assistant.")
@@ -251,23 +637,32 @@ class ChattyAssistant:
             print(f"Type {Fore.YELLOW}'help'{Style.RESET_ALL} to see available commands.")
             self.session_started = True
     
+        commands = self.commands
         while True:
             try:
-                user_input = await asyncio.to_thread(input, f"\n{Fore.BLUE}You: {Style.RESET_ALL}")
+                user_input = await asyncio.to_thread(input, _PROMPT_YOU)
                 clean_input = user_input.strip().lower()
                 
                 # Check for direct commands
-                if clean_input in self.commands:
-                    await self.commands[clean_input]()
+                command = commands.get(clean_input)
+                if command is not None:
+                    await command()
                     continue
     
                 print("Thinking...")
                 
-                # Use the LLM to determine the appropriate action (e.g., TOOL_USE or CHAT)
-                response = await self._send_to_ollama(
-                    f"Determine the best action for this user input: '{user_input}'",
-                    Config.TEMPERATURE_CONVERSATION
-                )
+                # Use the LLM to determine the appropriate action (e.g., TOOL_USE or CHAT).
+                # Decisions carry arguments copied from the input (e.g. filenames), so the
+                # cache key keeps its case.
+                intent_key = user_input.strip()
+                response = self._get_cached_intent(intent_key)
+                if response is None:
+                    response = await self._send_to_ollama(
+                        f"Determine the best action for this user input: '{user_input}'",
+                        Config.TEMPERATURE_CONVERSATION
+                    )
+                    if response and response.get("type"):
+                        self._cache_intent(intent_key, response)
     
                 if not response or not response.get("type"):
                     print(f"{Fore.RED}Sorry, I can't process that right now. Please try again.")
@@ -281,25 +676,24 @@ class ChattyAssistant:
                     tool_args = response.get("arguments", {})
                     
                     tool_output = await self._execute_tool_call(tool_name, tool_args)
-                    self.chat_history.append({"role": "tool_output", "content": tool_output})
+                    self._append_history({"role": "tool_output", "content": tool_output})
                     
                     # Send the tool output back to the LLM to get a user-friendly response
                     prompt_for_final_response = f"User: {user_input}\nTool Output: {tool_output}"
                     final_response_text = await self._send_to_ollama(
                         prompt_for_final_response,
                         Config.TEMPERATURE_SEARCH,
-                        format_as="text"
+                        format_as="text",
+                        echo=True
                     )
                     
-                    print(f"\n{Fore.CYAN}{final_response_text}{Style.RESET_ALL}\n")
-                    self.chat_history.append({"role": "assistant", "content": final_response_text})
+                    self._append_history({"role": "assistant", "content": final_response_text})
     
                 # Handle code generation or conversation directly
                 else: # "CODE" or "CONVERSATION"
                     query = response.get("query")
-                    response_text = await self._send_to_ollama(query, Config.TEMPERATURE_SEARCH, format_as="text")
-                    print(f"\n{Fore.CYAN}{response_text}{Style.RESET_ALL}\n")
-                    self.chat_history.append({"role": "assistant", "content": response_text})
+                    response_text = await self._cached_send(query, Config.TEMPERATURE_SEARCH, format_as="text", echo=True)
+                    self._append_history({"role": "assistant", "content": response_text})
     
                     # Check if the response was code and offer to run it
                     if action == "CODE":
@@ -308,6 +702,7 @@ class ChattyAssistant:
                             print(f"{Fore.YELLOW}Type '{Style.BRIGHT}run code{Style.NORMAL}' to execute it.{Style.RESET_ALL}")
             
             except asyncio.CancelledError:
+                await self.aclose()
                 print(f"{Fore.GREEN}\nGoodbye!")
                 sys.exit(0)
             except Exception as e:
@@ -315,8 +710,8 @@ class ChattyAssistant:
                 
 # --- Entry Point ---
 async def main() -> None:
-    assistant = ChattyAssistant()
-    await assistant.run()
+    async with ChattyAssistant() as assistant:
+        await assistant.run()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,135 @@
+# semantic_cache.py
+import logging
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+import orjson
+
+class SemanticCache:
+    """
+    A two-tier cache of LLM responses that persists across sessions.
+    Lookups try an exact prompt match first, then the most similar cached
+    prompt by embedding cosine similarity. Entries are appended to a
+    JSON Lines file so they can be reloaded on the next start; only the
+    most recent max_entries are kept.
+    """
+    def __init__(self, path: str, threshold: float = 0.95, max_entries: int = 1000):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        # prompt -> (unit-normalized embedding or None, response), oldest first
+        self._entries: "OrderedDict[str, Tuple[Optional[np.ndarray], Any]]" = OrderedDict()
+        # Embedding matrix and matching responses, rebuilt lazily after changes
+        self._vectors: Optional[np.ndarray] = None
+        self._vector_responses: List[Any] = []
+        self._dirty = False
+        # Number of lines in the cache file, including superseded and evicted entries
+        self._file_lines = 0
+        self._load()
+
+    def _load(self) -> None:
+        """Loads previously cached entries from disk, skipping any that are malformed."""
+        skipped = 0
+        try:
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = orjson.loads(line)
+                        self._remember(entry["prompt"], entry.get("embedding"), entry["response"])
+                    except (orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+                        skipped += 1
+                        continue
+                    self._file_lines += 1
+        except FileNotFoundError:
+            return
+        except IOError as e:
+            logging.error(f"Failed to load semantic cache: {e}")
+            return
+        if skipped:
+            logging.warning(f"Skipped {skipped} malformed entries in the semantic cache.")
+        if skipped or self._file_lines > len(self._entries):
+            # Rewrite the file so new entries are not appended after a corrupt line
+            self._compact()
+
+    def _remember(self, prompt: str, embedding: Optional[List[float]], response: Any) -> None:
+        """Adds an entry to memory, evicting the oldest one when full."""
+        vector = None
+        if embedding:
+            vector = np.asarray(embedding, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            vector = vector / norm if norm else None
+        self._entries.pop(prompt, None)
+        self._entries[prompt] = (vector, response)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._dirty = True
+
+    def _rebuild_vectors(self) -> None:
+        """Stacks the cached embeddings into a matrix for similarity search."""
+        self._dirty = False
+        rows = [(v, r) for v, r in self._entries.values() if v is not None]
+        if rows:
+            # Only vectors from the current embedding model are comparable
+            dim = rows[-1][0].shape[0]
+            rows = [(v, r) for v, r in rows if v.shape[0] == dim]
+        self._vectors = np.vstack([v for v, _ in rows]) if rows else None
+        self._vector_responses = [r for _, r in rows]
+
+    def _compact(self) -> None:
+        """Rewrites the cache file with only the entries still held in memory."""
+        try:
+            with open(self.path, "wb") as f:
+                for prompt, (vector, response) in self._entries.items():
+                    embedding = vector.tolist() if vector is not None else None
+                    entry = {"prompt": prompt, "embedding": embedding, "response": response}
+                    f.write(orjson.dumps(entry) + b"\n")
+            self._file_lines = len(self._entries)
+        except IOError as e:
+            logging.error(f"Failed to write semantic cache: {e}")
+
+    def get_exact(self, prompt: str) -> Optional[Any]:
+        """Returns the cached response for an identical prompt, if any."""
+        entry = self._entries.get(prompt)
+        return entry[1] if entry is not None else None
+
+    def get_similar(self, embedding: List[float]) -> Optional[Any]:
+        """Returns the cached response whose prompt is most similar above the threshold."""
+        if self._dirty:
+            self._rebuild_vectors()
+        if self._vectors is None:
+            return None
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0 or query.shape[0] != self._vectors.shape[1]:
+            return None
+        scores = self._vectors @ (query / norm)
+        best = int(np.argmax(scores))
+        if scores[best] >= self.threshold:
+            return self._vector_responses[best]
+        return None
+
+    def add(self, prompt: str, embedding: Optional[List[float]], response: Any) -> None:
+        """Caches a response in memory and appends it to the cache file."""
+        self._remember(prompt, embedding, response)
+        if self._file_lines >= 2 * self.max_entries:
+            # Drop superseded and evicted lines so the file stays bounded
+            self._compact()
+            return
+        try:
+            with open(self.path, "ab") as f:
+                entry = {"prompt": prompt, "embedding": embedding, "response": response}
+                f.write(orjson.dumps(entry) + b"\n")
+            self._file_lines += 1
+        except IOError as e:
+            logging.error(f"Failed to write semantic cache: {e}")
+
+    def clear(self) -> None:
+        """Removes every cached entry, in memory and on disk."""
+        self._entries.clear()
+        self._vectors = None
+        self._vector_responses = []
+        self._dirty = False
+        self._compact()
@@ -3,18 +3,25 @@ import asyncio
 import os
 from typing import Dict, Any
 
+import aiofiles
+
 # Assuming google_search is a module with a search function
 import google_search
 
+# Upper bound on the search context handed back to the LLM
+MAX_SNIPPET_CHARS = 4096
+
 class BaseTool:
     """
     A base class for all tools.
     This provides a common interface for name and description,
     and defines the run() method that all subclasses must implement.
+    Subclasses set name and description as class attributes.
     """
-    def __init__(self, name: str, description: str):
-        self.name = name
-        self.description = description
+    __slots__ = ()
+
+    name: str = ""
+    description: str = ""
 
     async def run(self, **kwargs: Any) -> str:
         """
@@ -27,11 +34,10 @@ class GoogleSearchTool(BaseTool):
     """
     A tool for performing Google searches.
     """
-    def __init__(self):
-        super().__init__(
-            name="google_search",
-            description="Searches for information on Google. Arguments: 'query' (str)."
-        )
+    __slots__ = ()
+
+    name = "google_search"
+    description = "Searches for information on Google. Arguments: 'query' (str)."
 
     async def run(self, query: str) -> str:
         """
@@ -46,12 +52,15 @@ class GoogleSearchTool(BaseTool):
             if not search_results_list or not search_results_list[0].results:
                 return "No search results found."
 
-            context_snippets = [r.snippet for r in search_results_list[0].results if r.snippet]
+            # Deduplicate snippets while preserving their order.
+            results = search_results_list[0].results
+            context_snippets = list(dict.fromkeys(r.snippet for r in results if r.snippet))
             if not context_snippets:
                 return "I found results, but no useful snippets to answer your question."
             
-            # Join the snippets for a coherent response.
-            return "\n".join(context_snippets)
+            # Join the snippets for a coherent response, capped so the
+            # follow-up prompt to the LLM stays small.
+            return "\n".join(context_snippets)[:MAX_SNIPPET_CHARS]
         except Exception as e:
             return f"An error occurred while executing the Google Search tool: {e}"
 
@@ -59,11 +68,10 @@ class FileTool(BaseTool):
     """
     A tool for performing file operations like reading and writing.
     """
-    def __init__(self):
-        super().__init__(
-            name="file_tool",
-            description="Performs file operations. Arguments: 'action' (str), 'filename' (str), 'content' (str)."
-        )
+    __slots__ = ()
+
+    name = "file_tool"
+    description = "Performs file operations. Arguments: 'action' (str), 'filename' (str), 'content' (str)."
 
     async def run(self, action: str, filename: str, content: str = None) -> str:
         """
@@ -80,14 +88,11 @@ class FileTool(BaseTool):
 
     async def _read_file(self, filename: str) -> str:
         """
-        Reads a file from the local file system in a separate thread.
+        Reads a file from the local file system asynchronously.
         """
         try:
-            def sync_read():
-                with open(filename, 'r') as f:
-                    return f.read()
-            
-            content = await asyncio.to_thread(sync_read)
+            async with aiofiles.open(filename, 'r') as f:
+                content = await f.read()
             return f"File '{filename}' content:\n---\n{content}\n---"
         except FileNotFoundError:
             return f"Error: File not found at '{filename}'."
@@ -96,14 +101,11 @@ class FileTool(BaseTool):
 
     async def _write_file(self, filename: str, content: str) -> str:
         """
-        Writes content to a file on the local file system in a separate thread.
+        Writes content to a file on the local file system asynchronously.
         """
         try:
-            def sync_write():
-                with open(filename, 'w') as f:
-                    f.write(content)
-
-            await asyncio.to_thread(sync_write)
+            async with aiofiles.open(filename, 'w') as f:
+                await f.write(content)
             return f"Content successfully written to '{filename}'."
         except Exception as e:
             return f"Error writing to file '{filename}': {e}"